@@ -1,4 +1,5 @@
 import asyncio
+from typing import Optional
 import typer
 import requests
 from rich.console import Console
@@ -59,7 +60,8 @@ def status():
     console.print(f"Total Agents:       [green]{data['total_agents']}[/green]")
     console.print(f"Connected Agents:   [green]{data['connected_agents']}[/green]")
     console.print(f"Queued Commands:    [yellow]{data['queued_commands']}[/yellow]")
-    console.print(f"Executed Commands:  [cyan]{data['executed_commands']}[/cyan]\n")
+    console.print(f"Executed Commands:  [cyan]{data['executed_commands']}[/cyan]")
+    console.print(f"Coalesced Commands: [cyan]{data['coalesced_commands']}[/cyan]\n")
 
     if data["connected_ids"]:
         table = Table(title="Connected Agents")
@@ -72,32 +74,39 @@ def status():
 
 
 @app.command()
-def send(agent_id: str, command: str):
+def send(agent_id: str, command: str, coalesce_key: Optional[str] = None):
     """Send a command to a specific agent using id."""
-    r = requests.post(
-        f"{SERVER_URL}/commands/send/{agent_id}", params={"command": command}
-    )
+    params = {"command": command}
+    if coalesce_key:
+        params["coalesce_key"] = coalesce_key
+    r = requests.post(f"{SERVER_URL}/commands/send/{agent_id}", params=params)
     handle_response(r)
 
 
 @app.command()
-def send_to_all(command: str):
+def send_to_all(command: str, coalesce_key: Optional[str] = None):
     """Send a command to all connected agents."""
-    r = requests.post(f"{SERVER_URL}/commands/send_to_all", params={"command": command})
+    params = {"command": command}
+    if coalesce_key:
+        params["coalesce_key"] = coalesce_key
+    r = requests.post(f"{SERVER_URL}/commands/send_to_all", params=params)
     handle_response(r)
 
 
 @app.command()
-def send_multiple(command: str, agent_ids: str):
+def send_multiple(command: str, agent_ids: str, coalesce_key: Optional[str] = None):
     """
     Send a command to multiple agents.
     Example:
         python cli.py send_multiple "diagnostic" "id1,id2,id3"
     """
     ids = [a.strip() for a in agent_ids.split(",")]
+    params = {"command": command}
+    if coalesce_key:
+        params["coalesce_key"] = coalesce_key
     r = requests.post(
         f"{SERVER_URL}/commands/send_multiple",
-        params={"command": command},
+        params=params,
         json=ids,
         headers={"Content-Type": "application/json"},
     )
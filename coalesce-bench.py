@@ -0,0 +1,65 @@
+import importlib.util
+import time
+from fastapi.testclient import TestClient
+
+# compare queue size and replay time after an agent outage with and without
+# coalescing of duplicate pending commands
+OUTAGE_HOURS = 24
+STATUS_INTERVAL = 5 * 60  # seconds between send_to_all("status") calls
+EXECUTION_TIME = 2  # simulated execution time per command in ws-async-agent.py
+
+
+def load_server():
+    spec = importlib.util.spec_from_file_location("server", "ws-async-server.py")
+    server = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(server)
+    return server
+
+
+def run(coalesce_key=None):
+    server = load_server()
+    # one portal for http and websocket calls so they share an event loop
+    with TestClient(server.app) as client:
+        agent_id = "bench-agent"
+        client.post("/agents/register", json={"id": agent_id, "name": "bench"})
+
+        # agent offline, commands pile up
+        sent = OUTAGE_HOURS * 3600 // STATUS_INTERVAL
+        params = {"command": "status"}
+        if coalesce_key:
+            params["coalesce_key"] = coalesce_key
+        for _ in range(sent):
+            client.post("/commands/send_to_all", params=params)
+        queued = client.get("/status").json()["queued_commands"]
+
+        # agent reconnects and works through the replayed commands
+        start = time.perf_counter()
+        with client.websocket_connect(f"/ws/{agent_id}") as ws:
+            for _ in range(queued):
+                data = ws.receive_json()
+                client.post(
+                    f"/responses/{agent_id}/{data['id']}",
+                    params={"result": f"Executed '{data['command']}' successfully."},
+                )
+        replay = time.perf_counter() - start
+
+        status = client.get("/status").json()
+        return {
+            "sent": sent,
+            "queued": queued,
+            "executed": status["executed_commands"],
+            "coalesced": status["coalesced_commands"],
+            "replay_s": replay,
+            "simulated_execution_s": queued * EXECUTION_TIME,
+        }
+
+
+if __name__ == "__main__":
+    for label, key in (("without coalescing", None), ("with coalescing", "status")):
+        r = run(key)
+        print(
+            f"{label:>20}: sent={r['sent']} queued={r['queued']} "
+            f"coalesced={r['coalesced']} executed={r['executed']} "
+            f"replay={r['replay_s']:.3f}s "
+            f"simulated_execution={r['simulated_execution_s']}s"
+        )
@@ -0,0 +1,55 @@
+import os
+import sys
+import time
+import subprocess
+
+# compare RSS and open file descriptors per device between one process per agent
+# (ws-async-agent.py) and a single gateway process (ws-gateway-agent.py).
+# needs a running server: fastapi run ws-async-server.py (linux only, reads /proc)
+DEVICE_COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+SETTLE_TIME = 5  # seconds to wait for agents to register and connect
+
+
+def rss_kb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def fd_count(pid):
+    return len(os.listdir(f"/proc/{pid}/fd"))
+
+
+def measure(cmds):
+    procs = [
+        subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        for cmd in cmds
+    ]
+    try:
+        time.sleep(SETTLE_TIME)
+        rss = sum(rss_kb(p.pid) for p in procs)
+        fds = sum(fd_count(p.pid) for p in procs)
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.wait()
+    return rss, fds
+
+
+if __name__ == "__main__":
+    runs = {
+        "process per agent": [
+            [sys.executable, "ws-async-agent.py"] for _ in range(DEVICE_COUNT)
+        ],
+        "gateway": [[sys.executable, "ws-gateway-agent.py", str(DEVICE_COUNT)]],
+    }
+    for label, cmds in runs.items():
+        rss, fds = measure(cmds)
+        print(
+            f"{label:>18}: devices={DEVICE_COUNT} processes={len(cmds)} "
+            f"rss={rss / 1024:.1f}MiB ({rss / DEVICE_COUNT:.0f}KiB/device) "
+            f"fds={fds} ({fds / DEVICE_COUNT:.2f}/device)"
+        )
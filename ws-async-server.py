@@ -1,8 +1,9 @@
 from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, Body
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Union
 import uuid
+import json
 import asyncio
 
 
@@ -20,15 +21,70 @@ class Command(BaseModel):
     result: Optional[str] = None
     pushed: bool = False
     executed: bool = False
+    # commands with the same key are merged while undelivered
+    coalesce_key: Optional[str] = None
+    merged_ids: List[str] = []
+
+
+# one websocket shared by many agents behind a gateway, frames are tagged with
+# the agent id so the gateway can route them to the right device
+class GatewayConnection:
+    def __init__(self, websocket: WebSocket, gateway_id: str, agent_id: str):
+        self.websocket = websocket
+        self.gateway_id = gateway_id
+        self.agent_id = agent_id
+
+    async def send_json(self, data: dict):
+        await self.websocket.send_json({"agent_id": self.agent_id, **data})
 
 
 # In-memory storage
 agents: Dict[str, Agent] = {}
 commands: Dict[str, List[Command]] = {}
-connections: Dict[str, WebSocket] = {}
+connections: Dict[str, Union[WebSocket, GatewayConnection]] = {}
 storage_lock = asyncio.Lock()
 
 
+# queue a command for an agent, merging it into an undelivered command with the
+# same coalesce key and command text if there is one. caller must hold storage_lock
+def queue_command(agent_id: str, command: str, coalesce_key: Optional[str] = None):
+    cmd_id = str(uuid.uuid4())
+    if coalesce_key is not None:
+        for cmd in commands[agent_id]:
+            if (
+                cmd.coalesce_key == coalesce_key
+                and cmd.command == command
+                and not (cmd.pushed or cmd.executed)
+            ):
+                cmd.merged_ids.append(cmd_id)
+                return cmd_id, cmd, True
+    cmd = Command(id=cmd_id, command=command, coalesce_key=coalesce_key)
+    commands[agent_id].append(cmd)
+    return cmd_id, cmd, False
+
+
+# send any pending commands again that havent been executed.
+# caller must hold storage_lock
+async def resend_pending(agent_id: str, conn: Union[WebSocket, GatewayConnection]):
+    if agent_id in commands:
+        pending = [cmd for cmd in commands[agent_id] if not cmd.executed]
+        for cmd in pending:
+            await conn.send_json({"id": cmd.id, "command": cmd.command})
+            cmd.pushed = True
+            print(f"Re-sent pending command '{cmd.command}' to agent {agent_id}")
+
+
+# store an agent's result for a command. caller must hold storage_lock
+def store_result(agent_id: str, command_id: str, result: str) -> bool:
+    for cmd in commands[agent_id]:
+        # a single result resolves every command merged into this one
+        if cmd.id == command_id or command_id in cmd.merged_ids:
+            cmd.result = result
+            cmd.executed = True
+            return True
+    return False
+
+
 # registration using http
 @app.post("/agents/register")
 async def register_agent(agent: Agent):
@@ -40,6 +96,26 @@ async def register_agent(agent: Agent):
     return {"message": f"Agent {agent.name}, id:{agent.id} registered successfully."}
 
 
+# batch registration for gateways fronting many agents
+@app.post("/agents/register_batch")
+async def register_agents(agent_list: List[Agent]):
+    registered = []
+    skipped = []
+    async with storage_lock:
+        for agent in agent_list:
+            if agent.id in agents:
+                skipped.append(agent.id)
+                continue
+            agents[agent.id] = agent
+            commands[agent.id] = []
+            registered.append(agent.id)
+    return {
+        "message": f"Registered {len(registered)} agents.",
+        "registered": registered,
+        "skipped": skipped,
+    }
+
+
 # websocket endpoint
 @app.websocket("/ws/{agent_id}")
 async def agent_ws(websocket: WebSocket, agent_id: str):
@@ -49,11 +125,7 @@ async def agent_ws(websocket: WebSocket, agent_id: str):
 
     # on reconnect, send any pending commands again that havent been executed
     async with storage_lock:
-        if agent_id in commands:
-            pending = [cmd for cmd in commands[agent_id] if not cmd.executed]
-            for cmd in pending:
-                await websocket.send_json({"id": cmd.id, "command": cmd})
-                print(f"Re-sent pending command '{cmd.command}' to agent {agent_id}")
+        await resend_pending(agent_id, websocket)
 
     try:
         while True:
@@ -63,47 +135,120 @@ async def agent_ws(websocket: WebSocket, agent_id: str):
     except WebSocketDisconnect:
         # persistant tracking of agent connections
         print(f"Agent {agent_id} disconnected")
-        del connections[agent_id]
+        if connections.get(agent_id) is websocket:
+            del connections[agent_id]
+
+
+# multiplexed websocket endpoint for gateways serving many agents.
+# first frame lists the agent ids: {"agent_ids": [...]}, after that commands
+# are sent as {"agent_id", "id", "command"} and results come back as
+# {"agent_id", "id", "result"}
+@app.websocket("/ws/gateway/{gateway_id}")
+async def gateway_ws(websocket: WebSocket, gateway_id: str):
+    await websocket.accept()
+    agent_ids = []
+    try:
+        try:
+            hello = json.loads(await websocket.receive_text())
+            requested = hello["agent_ids"]
+            if not isinstance(requested, list):
+                raise TypeError("agent_ids must be a list")
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Gateway {gateway_id} sent a bad hello: {e}")
+            await websocket.close(code=1003)
+            return
+
+        async with storage_lock:
+            agent_ids = [a for a in requested if isinstance(a, str) and a in agents]
+            for agent_id in agent_ids:
+                conn = GatewayConnection(websocket, gateway_id, agent_id)
+                connections[agent_id] = conn
+                await resend_pending(agent_id, conn)
+        print(f"Gateway {gateway_id} connected with {len(agent_ids)} agents.")
+
+        while True:
+            msg = await websocket.receive_text()
+            # skip bad frames instead of dropping every agent on the gateway
+            try:
+                data = json.loads(msg)
+                agent_id = data["agent_id"]
+                cmd_id = data["id"]
+                result = data["result"]
+            except (ValueError, KeyError, TypeError):
+                print(f"Received from gateway {gateway_id}: {msg}")
+                continue
+            if agent_id not in agent_ids:
+                print(f"Gateway {gateway_id} sent result for unknown agent {agent_id}")
+                continue
+            async with storage_lock:
+                if not store_result(agent_id, cmd_id, str(result)):
+                    print(f"Unknown command {cmd_id} for agent {agent_id}")
+    except WebSocketDisconnect:
+        print(f"Gateway {gateway_id} disconnected")
+    finally:
+        for agent_id in agent_ids:
+            conn = connections.get(agent_id)
+            if isinstance(conn, GatewayConnection) and conn.websocket is websocket:
+                del connections[agent_id]
 
 
 # command sending to specific agent with http
 @app.post("/commands/send/{agent_id}")
-async def send_command(agent_id: str, command: str):
+async def send_command(
+    agent_id: str, command: str, coalesce_key: Optional[str] = None
+):
     async with storage_lock:
         if agent_id not in agents:
             raise HTTPException(status_code=404, detail="Agent not found.")
-        cmd = Command(id=str(uuid.uuid4()), command=command)
-        commands[agent_id].append(cmd)
-        if agent_id in connections:
+        cmd_id, cmd, coalesced = queue_command(agent_id, command, coalesce_key)
+        if agent_id in connections and not coalesced:
             await connections[agent_id].send_json({"id": cmd.id, "command": command})
-            commands[agent_id][-1].pushed = True
+            cmd.pushed = True
             return {
                 "message": f"Command '{command}' sent to agent {agent_id}",
+                "command_id": cmd_id,
                 "pushed": True,
             }
-        commands[agent_id][-1].pushed = False
+        if coalesced:
+            return JSONResponse(
+                {
+                    "message": f"Command merged into pending command {cmd.id}.",
+                    "command_id": cmd_id,
+                    "pushed": False,
+                    "coalesced": True,
+                }
+            )
         return JSONResponse(
-            {"message": f"Agent {agent_id} offline. Command queued.", "pushed": False}
+            {
+                "message": f"Agent {agent_id} offline. Command queued.",
+                "command_id": cmd_id,
+                "pushed": False,
+            }
         )
 
 
 # sending command to all agents with http
 @app.post("/commands/send_to_all")
-async def send_command_to_all(command: str):
+async def send_command_to_all(command: str, coalesce_key: Optional[str] = None):
     async with storage_lock:
         if not agents:
             raise HTTPException(status_code=404, detail="No agents registered.")
+        queued = {}
         for agent_id in agents:
-            cmd = Command(id=str(uuid.uuid4()), command=command)
             # add to storage
-            commands[agent_id].append(cmd)
+            _, cmd, coalesced = queue_command(agent_id, command, coalesce_key)
+            if not coalesced:
+                queued[agent_id] = cmd
 
         # gather tasks for better concurrency
         # push if connected
         send_tasks = []
         for agent_id, ws in connections.items():
+            if agent_id not in queued:
+                continue
+            cmd = queued[agent_id]
             send_tasks.append(ws.send_json({"id": cmd.id, "command": command}))
-            commands[agent_id][-1].pushed = True
+            cmd.pushed = True
         await asyncio.gather(*send_tasks, return_exceptions=True)
 
     return {"message": f"Sent '{command}' to {len(agents)} agents."}
@@ -112,7 +257,9 @@ async def send_command_to_all(command: str):
 # send command to multiple agents (list in JSON body)
 @app.post("/commands/send_multiple")
 async def send_command_multiple(
-    agent_ids: List[str] = Body(...), command: str = "status"
+    agent_ids: List[str] = Body(...),
+    command: str = "status",
+    coalesce_key: Optional[str] = None,
 ):
     async with storage_lock:
         pushed_agents = []
@@ -120,14 +267,14 @@ async def send_command_multiple(
             if agent_id not in agents:
                 print(f"skipping unknown agent {agent_id}")
                 continue
-            cmd = Command(id=str(uuid.uuid4()), command=command)
-            commands[agent_id].append(cmd)
+            _, cmd, coalesced = queue_command(agent_id, command, coalesce_key)
             pushed_agents.append(agent_id)
             # push if connected
-            if agent_id in connections:
+            if agent_id in connections and not coalesced:
                 await connections[agent_id].send_json(
                     {"id": cmd.id, "command": command}
                 )
+                cmd.pushed = True
     return {
         "message": f"Sent '{command}' to {len(pushed_agents)} agents",
         "agents": pushed_agents,
@@ -153,12 +300,16 @@ async def system_status():
         executed_commands = sum(
             len([c for c in cmds if c.executed]) for cmds in commands.values()
         )
+        coalesced_commands = sum(
+            len(c.merged_ids) for cmds in commands.values() for c in cmds
+        )
 
     return {
         "total_agents": total_agents,
         "connected_agents": connected_agents,
         "queued_commands": queued_commands,
         "executed_commands": executed_commands,
+        "coalesced_commands": coalesced_commands,
         "connected_ids": list(connections.keys()),
     }
 
@@ -169,11 +320,8 @@ async def post_response(agent_id: str, command_id: str, result: str):
     async with storage_lock:
         if agent_id not in commands:
             raise HTTPException(status_code=404, detail="Agent not found.")
-        for cmd in commands[agent_id]:
-            if cmd.id == command_id:
-                cmd.result = result
-                cmd.executed = True
-                return {"message": "Result received.", "result": result}
+        if store_result(agent_id, command_id, result):
+            return {"message": "Result received.", "result": result}
     raise HTTPException(status_code=404, detail="Command not found.")
 
 
@@ -0,0 +1,74 @@
+import sys
+import uuid
+import asyncio
+import aiohttp
+import websockets
+import json
+
+SERVER_URL = "http://127.0.0.1:8000"
+SERVER_WS = "ws://127.0.0.1:8000"
+GATEWAY_ID = str(uuid.uuid4())
+GATEWAY_NAME = "WebSocketGatewayTest1"
+# number of virtual agents (devices) served by this gateway
+DEVICE_COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+AGENTS = [
+    {"id": str(uuid.uuid4()), "name": f"{GATEWAY_NAME}-device{i}"}
+    for i in range(DEVICE_COUNT)
+]
+
+
+async def register(session):
+    # register all devices in a single request
+    async with session.post(f"{SERVER_URL}/agents/register_batch", json=AGENTS) as r:
+        print("Agents registered:", (await r.json())["message"])
+
+
+async def execute_cmd(agent_id, command):
+    print(f"[{agent_id}] Executing command: {command}")
+    # simulation of execution
+    await asyncio.sleep(2)
+    results = f"Executed '{command}' successfully."
+    return results
+
+
+async def handle_command(ws, agent_id, cmd_id, cmd):
+    result = await execute_cmd(agent_id, cmd)
+    # results go back over the shared websocket, tagged with the agent id
+    try:
+        await ws.send(
+            json.dumps({"agent_id": agent_id, "id": cmd_id, "result": result})
+        )
+    except websockets.ConnectionClosed:
+        # server replays unexecuted commands when the gateway reconnects
+        print(f"[{agent_id}] connection lost before result for {cmd_id} was sent")
+
+
+async def listen_for_commands():
+    async with aiohttp.ClientSession() as session:
+        await register(session)
+    agent_ids = {a["id"] for a in AGENTS}
+    while True:
+        try:
+            async with websockets.connect(f"{SERVER_WS}/ws/gateway/{GATEWAY_ID}") as ws:
+                await ws.send(json.dumps({"agent_ids": list(agent_ids)}))
+                print(f"[{GATEWAY_NAME}] connected with {len(agent_ids)} agents")
+                # route commands to virtual agents, executed concurrently
+                tasks = set()
+                async for message in ws:
+                    data = json.loads(message)
+                    agent_id = data.get("agent_id")
+                    if agent_id not in agent_ids:
+                        print(f"[{GATEWAY_NAME}] unknown agent {agent_id}")
+                        continue
+                    task = asyncio.create_task(
+                        handle_command(ws, agent_id, data["id"], data["command"])
+                    )
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+        except (websockets.ConnectionClosed, ConnectionError):
+            print(f"[{GATEWAY_NAME}] connection lost. Retrying in 5s")
+            await asyncio.sleep(5)
+
+
+if __name__ == "__main__":
+    asyncio.run(listen_for_commands())